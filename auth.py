@@ -1,18 +1,39 @@
 """Logic for authenticating users using Authorization header.
 
+Attributes:
+    MAX_AUTH_HEADER_LENGTH: An int representing the max length of an
+        Authorization header that will be processed
+    AUTH_CACHE_TTL: An int representing the number of seconds a successfully
+        authenticated Authorization header is trusted without rechecking it
+
 Classes:
     AuthGraphQLView()
 """
 
 import base64
 import binascii
+import hashlib
+import logging
+import threading
 from functools import wraps
 
+from cachetools import TTLCache
 from flask import request
 from flask_graphql import GraphQLView
 from graphql import GraphQLError
 
 from models import User
+from persisted_queries import CachedBackend, apply_persisted_query
+from schema import create_context
+
+MAX_AUTH_HEADER_LENGTH = 4096
+AUTH_CACHE_TTL = 60
+
+logger = logging.getLogger(__name__)
+
+# Maps the sha256 digest of an Authorization header to the authenticated uuid
+_auth_cache = TTLCache(maxsize=1024, ttl=AUTH_CACHE_TTL)
+_auth_cache_lock = threading.Lock()
 
 
 def basic_auth(f):
@@ -28,30 +49,90 @@ def basic_auth(f):
         if auth is None:
             raise GraphQLError("Authorization header is missing")
 
-        if not auth.startswith("Basic "):
+        if len(auth) > MAX_AUTH_HEADER_LENGTH:
             raise GraphQLError("Invalid Authorization header")
 
-        auth = auth.replace("Basic ", "", 1)
-        try:
-            auth = base64.b64decode(auth).decode("utf-8")
-        except binascii.Error:
-            raise GraphQLError("Unable to decode Authorization header")
-
-        auth = auth.split(":", 1)
-        if len(auth) < 2:
-            raise GraphQLError("Password is missing from Authorization header")
+        auth_digest = hashlib.sha256(auth.encode("latin-1")).digest()
+        with _auth_cache_lock:
+            is_cached = auth_digest in _auth_cache
 
-        username, password = auth
-        user = User.query.filter_by(username=username).first()
-        if user is None or not user.check_password(password):
-            raise GraphQLError("Invalid username and/or password")
+        if not is_cached:
+            user = authenticate(auth)
+            with _auth_cache_lock:
+                _auth_cache[auth_digest] = user.uuid
 
         return f(*args, **kwargs)
 
     return decorator
 
 
+def authenticate(auth):
+    """Authenticate a user from the value of a basic Authorization header.
+
+    Args:
+        auth: A str representing the value of the Authorization header
+
+    Returns:
+        user: A User object representing the authenticated user
+    """
+    payload = auth[6:]
+    if not auth.startswith("Basic ") or not payload or len(payload) % 4:
+        raise GraphQLError("Invalid Authorization header")
+
+    try:
+        auth = base64.b64decode(payload.encode("ascii"), validate=True)
+    except (binascii.Error, UnicodeEncodeError):
+        raise GraphQLError("Unable to decode Authorization header")
+
+    if b"\x00" in auth:
+        logger.warning("Rejected Authorization header containing a NUL byte")
+        raise GraphQLError("Invalid Authorization header")
+
+    username, sep, password = auth.partition(b":")
+    if not sep:
+        raise GraphQLError("Password is missing from Authorization header")
+
+    try:
+        username = username.decode("utf-8")
+        password = password.decode("utf-8")
+    except UnicodeDecodeError:
+        raise GraphQLError("Unable to decode Authorization header")
+
+    user = User.query.filter_by(username=username).first()
+    if user is None or not user.check_password(password):
+        raise GraphQLError("Invalid username and/or password")
+
+    return user
+
+
 class AuthGraphQLView(GraphQLView):
-    """GraphQLView subclassed with a basic authentication decorator."""
+    """GraphQLView subclassed with a basic authentication decorator.
+
+    Validated queries are cached by the backend, and JSON requests may use
+    Automatic Persisted Queries to send a query hash in place of a query.
+    """
 
     decorators = [basic_auth]
+    backend = CachedBackend()
+
+    def parse_body(self):
+        """Parse the body of a request, resolving any persisted queries.
+
+        Returns:
+            data: A dict or list of dicts representing the GraphQL request(s)
+        """
+        data = super().parse_body()
+        if request.mimetype == "application/json":
+            for params in data if isinstance(data, list) else [data]:
+                if isinstance(params, dict):
+                    apply_persisted_query(params)
+
+        return data
+
+    def get_context(self):
+        """Create the context for the resolvers of a request.
+
+        Returns:
+            A dict representing the request and the loaders for its resolvers
+        """
+        return create_context(request)
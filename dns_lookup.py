@@ -3,67 +3,318 @@
 Attributes:
     DNS_SERVERS: A list of strs representing which DNS servers to use
     DNS_BLOCKLIST: A str representing the blocklist to send a DNS lookup to
+    DNS_TIMEOUT: A float representing the max number of seconds to wait on a
+        single DNS lookup
+    DNS_CACHE_TTL: An int representing the number of seconds to cache a
+        lookup that returned no response codes
+    DNS_CACHE_MAX_TTL: An int representing the max number of seconds to cache
+        a lookup regardless of the TTL of its answer
+    MAX_CONCURRENT_LOOKUPS: An int representing the max number of DNS lookups
+        in flight at once for a batch of ip addresses
+    ENQUEUE_BATCH_SIZE: An int representing the max number of enqueued ip
+        addresses the background worker upserts at once
 """
 
+import asyncio
+import atexit
+import logging
+import socket
+import threading
+import time
+
+import dns.asyncresolver
+import dns.name
 import dns.resolver
+from cachetools import TLRUCache
 
-from models import IPDetails, ResponseCode
+from models import IPDetails, db
 
 # Spamhaus will not work with Google's public DNS servers
 # https://www.spamhaus.org/faq/section/DNSBL%20Usage#261
 DNS_SERVERS = ["208.67.222.222"]  # OpenDNS
 DNS_BLOCKLIST = "zen.spamhaus.org"
+DNS_TIMEOUT = 2.0
+DNS_CACHE_TTL = 300
+DNS_CACHE_MAX_TTL = 600
+MAX_CONCURRENT_LOOKUPS = 10
+ENQUEUE_BATCH_SIZE = 64
+
+logger = logging.getLogger(__name__)
+
+# Maps a packed ip address to a (response codes, expires at) tuple
+_dns_cache = TLRUCache(maxsize=10_000, ttu=lambda _key, value, _now: value[1])
+_dns_cache_lock = threading.Lock()
+
+_resolver = dns.asyncresolver.Resolver(configure=False)
+_resolver.nameservers = DNS_SERVERS
+_resolver.lifetime = DNS_TIMEOUT
+
+_blocklist_name = dns.name.from_text(DNS_BLOCKLIST)
+_octet_labels = tuple(str(octet).encode() for octet in range(256))
 
+_worker_loop = None
+_worker_queue = None
+_worker_tasks = set()
+_worker_lock = threading.Lock()
 
-def upsert_ip_details(ip_address):
-    """Insert or update an IPDetails record in the db.
+
+def enqueue(ip_addresses):
+    """Hand off ip addresses to the background worker to be upserted.
+
+    The worker is started on first use. It runs its own event loop on a
+    daemon thread and upserts the queued ip addresses in batches of up to
+    ENQUEUE_BATCH_SIZE. Malformed ip addresses are dropped here so they
+    never take up a slot in a batch.
 
     Args:
-        ip_address: A str representing the record in the db to insert or update
+        ip_addresses: A list of strs representing the records in the db to
+            insert or update
     """
-    response_codes = dns_lookup(ip_address)
-    ip_details = IPDetails.query.filter_by(ip_address=ip_address).first()
-    if ip_details is None:
-        ip_details = IPDetails(
-            response_codes=response_codes, ip_address=ip_address
+    global _worker_loop, _worker_queue  # pylint: disable=global-statement
+    with _worker_lock:
+        if _worker_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="dns-lookup", daemon=True
+            )
+            thread.start()
+            try:
+                _worker_queue = asyncio.run_coroutine_threadsafe(
+                    start_worker(), loop
+                ).result()
+            except Exception:
+                loop.call_soon_threadsafe(loop.stop)
+                raise
+
+            _worker_loop = loop
+            atexit.register(stop_worker, loop, thread)
+
+    valid_ip_addresses = []
+    for ip_address in ip_addresses:
+        try:
+            pack_ip_address(ip_address)
+        except TypeError:
+            continue
+
+        valid_ip_addresses.append(ip_address)
+
+    if valid_ip_addresses:
+        _worker_loop.call_soon_threadsafe(
+            put_all, _worker_queue, valid_ip_addresses
         )
-        ip_details.insert()
-    else:
-        ip_details.response_codes = response_codes
-        ip_details.update()
 
 
-def dns_lookup(ip_address):
+def put_all(queue, items):
+    """Put many items on a queue without waiting.
+
+    Args:
+        queue: An asyncio Queue to put the items on
+        items: A list of the items to put on the queue
+    """
+    for item in items:
+        queue.put_nowait(item)
+
+
+async def start_worker():
+    """Create the worker's queue on the running loop and start draining it.
+
+    The queue has to be created on the loop that awaits it, so this runs on
+    the worker's loop rather than in the thread that starts the worker.
+
+    Returns:
+        An asyncio Queue to put the ip addresses to upsert on
+    """
+    queue = asyncio.Queue()
+    task = asyncio.ensure_future(process_queue(queue))
+    _worker_tasks.add(task)
+    task.add_done_callback(_worker_tasks.discard)
+    return queue
+
+
+def stop_worker(loop, thread):
+    """Cancel the background worker, then stop and close its event loop.
+
+    Registered to run at exit so the worker's task is finished rather than
+    destroyed while still pending.
+
+    Args:
+        loop: An asyncio event loop the worker runs on
+        thread: A Thread running the event loop
+    """
+    asyncio.run_coroutine_threadsafe(cancel_worker(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+async def cancel_worker():
+    """Cancel the task draining the worker's queue and wait for it to end."""
+    tasks = list(_worker_tasks)
+    for task in tasks:
+        task.cancel()
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def process_queue(queue):
+    """Upsert ip addresses from a queue in batches, forever.
+
+    Args:
+        queue: An asyncio Queue of strs representing the ip addresses to
+            insert or update
+    """
+    while True:
+        ip_addresses = [await queue.get()]
+        while len(ip_addresses) < ENQUEUE_BATCH_SIZE and not queue.empty():
+            ip_addresses.append(queue.get_nowait())
+
+        try:
+            IPDetails.bulk_upsert(await lookup_all(ip_addresses))
+        except Exception:  # pylint: disable=broad-except
+            db.session.rollback()
+            logger.exception("Unable to upsert %s", ip_addresses)
+
+
+def upsert_ip_details(ip_addresses):
+    """Insert or update IPDetails records in the db.
+
+    A synchronous helper that looks up and upserts the ip addresses in the
+    calling thread, bypassing the background worker.
+
+    Args:
+        ip_addresses: A list of strs representing the records in the db to
+            insert or update
+    """
+    response_codes = asyncio.run(lookup_all(ip_addresses))
+    IPDetails.bulk_upsert(response_codes)
+
+
+async def lookup_all(ip_addresses):
+    """Perform DNS lookups of many IP addresses to a blocklist concurrently.
+
+    Cached answers are collected up front so that only the ip addresses that
+    need a DNS query are scheduled. At most MAX_CONCURRENT_LOOKUPS lookups
+    are in flight at once so a large batch cannot flood the DNS servers. An
+    ip address that is malformed or whose lookup fails is left out of the
+    results.
+
+    Args:
+        ip_addresses: A list of strs representing the ip addresses to perform
+            a DNS lookup against a blocklist
+
+    Returns:
+        response_codes: A dict mapping a str representing an ip address to a
+            tuple of strs representing its returned response codes
+    """
+    packed_ip_addresses = {}
+    for ip_address in ip_addresses:
+        try:
+            packed_ip_addresses[ip_address] = pack_ip_address(ip_address)
+        except TypeError:
+            continue
+
+    response_codes = {}
+    uncached = []
+    with _dns_cache_lock:
+        for ip_address, packed_ip_address in packed_ip_addresses.items():
+            cached = _dns_cache.get(packed_ip_address)
+            if cached is None:
+                uncached.append(ip_address)
+            else:
+                response_codes[ip_address] = cached[0]
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_LOOKUPS)
+
+    async def bounded_resolve(ip_address):
+        async with semaphore:
+            return await resolve_response_codes(
+                packed_ip_addresses[ip_address]
+            )
+
+    results = await asyncio.gather(
+        *[bounded_resolve(ip) for ip in uncached],
+        return_exceptions=True,
+    )
+    response_codes.update(
+        {
+            ip_address: result
+            for ip_address, result in zip(uncached, results)
+            if not isinstance(result, BaseException)
+        }
+    )
+    return response_codes
+
+
+async def dns_lookup(ip_address):
     """Perform a DNS lookup of an IP address to a blocklist.
 
+    Answers are cached for their TTL (capped at DNS_CACHE_MAX_TTL) so an IP
+    address that is looked up repeatedly only hits the blocklist once.
+
     Args:
         ip_address: A str representing the ip address to perform a DNS lookup
             against a blocklist
 
     Returns:
-        response_codes: A list of ResponseCode objects representing the
-            returned response codes from the DNS lookup against a blocklist
+        response_codes: A tuple of strs representing the returned response
+            codes from the DNS lookup against a blocklist
     """
-    ip_address = ip_address.split(".")
-    if len(ip_address) != 4 or not all(num.isnumeric() for num in ip_address):
+    packed_ip_address = pack_ip_address(ip_address)
+    with _dns_cache_lock:
+        cached = _dns_cache.get(packed_ip_address)
+
+    if cached is not None:
+        return cached[0]
+
+    return await resolve_response_codes(packed_ip_address)
+
+
+def pack_ip_address(ip_address):
+    """Validate an IPv4 address and convert it to its packed form.
+
+    Args:
+        ip_address: A str representing an IPv4 address in dotted quad form
+
+    Returns:
+        A bytes of length 4 representing the packed ip address
+    """
+    try:
+        return socket.inet_pton(socket.AF_INET, ip_address)
+    except (OSError, TypeError, ValueError):
         raise TypeError("Incorrect format for IPv4 IP Address")
 
-    ip_address = ".".join(reversed(ip_address))
-    response_codes = []
-    dns.resolver.get_default_resolver().nameservers = DNS_SERVERS
+
+async def resolve_response_codes(packed_ip_address):
+    """Query a blocklist for an IP address and cache the answer.
+
+    Args:
+        packed_ip_address: A bytes of length 4 representing the packed ip
+            address to perform a DNS lookup against a blocklist
+
+    Returns:
+        response_codes: A tuple of strs representing the returned response
+            codes from the DNS lookup against a blocklist
+    """
+    query_name = dns.name.Name(
+        tuple(_octet_labels[octet] for octet in reversed(packed_ip_address))
+        + _blocklist_name.labels
+    )
     try:
-        answer = dns.resolver.resolve(f"{ip_address}.{DNS_BLOCKLIST}")
+        answer = await asyncio.wait_for(
+            _resolver.resolve(query_name, "A"),
+            timeout=DNS_TIMEOUT,
+        )
     except dns.resolver.NXDOMAIN:
-        return response_codes
-
-    for data in answer:
-        response_code = ResponseCode.query.filter_by(
-            response_code=str(data)
-        ).first()
-        if response_code is None:
-            response_code = ResponseCode(response_code=str(data))
-            response_code.insert()
+        response_codes = ()
+        ttl = DNS_CACHE_TTL
+    else:
+        response_codes = tuple(str(data) for data in answer)
+        ttl = min(answer.rrset.ttl, DNS_CACHE_MAX_TTL)
 
-        response_codes.append(response_code)
+    with _dns_cache_lock:
+        _dns_cache[packed_ip_address] = (
+            response_codes,
+            time.monotonic() + ttl,
+        )
 
     return response_codes
@@ -2,7 +2,10 @@
 
 Attributes:
     DATABASE_URL: A str representing the location of the db
+    ENGINE_OPTIONS: A dict representing the options used to create the
+        SQLAlchemy engine
     db: A SQLAlchemy service
+    password_hasher: An argon2 PasswordHasher used to hash user passwords
     ip_details_response_codes: A SQLAlchemy association table to map the
         many-to-many relationship between ip details and response codes
 
@@ -12,30 +15,75 @@ Classes:
     ResponseCode()
 """
 
+import sqlite3
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHash, VerificationError
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    event,
+    func,
+)
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import relationship
+from sqlalchemy.pool import QueuePool
 from werkzeug.security import check_password_hash
 
 DATABASE_URL = "sqlite:///db.sqlite3"
+ENGINE_OPTIONS = {
+    "poolclass": QueuePool,
+    "pool_size": 5,
+    "max_overflow": 10,
+    "connect_args": {"check_same_thread": False},
+}
 db = SQLAlchemy()
+password_hasher = PasswordHasher()
 
 
-def setup_db(app, database_url=DATABASE_URL):
+def setup_db(app, database_url=DATABASE_URL, engine_options=None):
     """Binds a flask application and a SQLAlchemy service.
 
     Args:
         app: A flask app
         database_url: A str representing the location of the db (default:
             global DATABASE_URL)
+        engine_options: A dict representing the options used to create the
+            SQLAlchemy engine (default: global ENGINE_OPTIONS)
     """
+    if engine_options is None:
+        engine_options = ENGINE_OPTIONS
+
     app.config["SQLALCHEMY_DATABASE_URI"] = database_url
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
     db.app = app
     db.init_app(app)
     db.create_all()
 
 
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, _):
+    """Tunes each new SQLite connection for concurrent reads and writes.
+
+    Args:
+        dbapi_connection: A DBAPI connection that was just opened
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+
 ip_details_response_codes = db.Table(
     "ip_details_response_codes",
     Column(
@@ -49,6 +97,7 @@ ip_details_response_codes = db.Table(
         Integer,
         ForeignKey("response_codes.uuid"),
         primary_key=True,
+        index=True,
     ),
 )
 
@@ -73,16 +122,41 @@ class User(db.Model):
         db.session.add(self)
         db.session.commit()
 
+    def set_password(self, password):
+        """Hashes and sets the password for this user.
+
+        Args:
+            password: A str representing the new password for the user
+        """
+        self.password_hash = password_hasher.hash(password)
+
     def check_password(self, password):
         """Check if a given password is correct for this user.
 
+        Hashes created before the switch to argon2, or with outdated argon2
+        parameters, are replaced with a current hash once the password has
+        been verified.
+
         Args:
             password: A str representing the password to check for the user
 
         Returns:
             A bool representing whether or not the given passord is correct
         """
-        return check_password_hash(self.password_hash, password)
+        try:
+            password_hasher.verify(self.password_hash, password)
+        except VerificationError:
+            return False
+        except InvalidHash:
+            if not check_password_hash(self.password_hash, password):
+                return False
+        else:
+            if not password_hasher.check_needs_rehash(self.password_hash):
+                return True
+
+        self.set_password(password)
+        db.session.commit()
+        return True
 
 
 class IPDetails(db.Model):
@@ -119,6 +193,83 @@ class IPDetails(db.Model):
         self.updated_at = func.now()
         db.session.commit()
 
+    @classmethod
+    def bulk_upsert(cls, response_codes_by_ip_address):
+        """Inserts or updates many ip details objects in the db at once.
+
+        A fixed number of statements is issued regardless of how many ip
+        addresses or response codes are given.
+
+        Args:
+            response_codes_by_ip_address: A dict mapping a str representing an
+                ip address to an iterable of strs representing the response
+                codes received from the last blocklist query for it
+        """
+        if not response_codes_by_ip_address:
+            return
+
+        ip_addresses = list(response_codes_by_ip_address)
+        existing = {
+            row.ip_address
+            for row in db.session.query(cls.ip_address).filter(
+                cls.ip_address.in_(ip_addresses)
+            )
+        }
+        if existing:
+            db.session.execute(
+                cls.__table__.update()
+                .where(cls.ip_address.in_(existing))
+                .values(updated_at=func.now())
+            )
+
+        new = [{"ip_address": ip} for ip in ip_addresses if ip not in existing]
+        if new:
+            db.session.execute(
+                cls.__table__.insert().prefix_with("OR IGNORE"), new
+            )
+
+        ip_details_uuids = dict(
+            db.session.query(cls.ip_address, cls.uuid).filter(
+                cls.ip_address.in_(ip_addresses)
+            )
+        )
+        db.session.execute(
+            ip_details_response_codes.delete().where(
+                ip_details_response_codes.c.ip_details_uuid.in_(
+                    ip_details_uuids.values()
+                )
+            )
+        )
+
+        response_codes = {
+            response_code
+            for response_codes in response_codes_by_ip_address.values()
+            for response_code in response_codes
+        }
+        if response_codes:
+            db.session.execute(
+                ResponseCode.__table__.insert().prefix_with("OR IGNORE"),
+                [{"response_code": code} for code in response_codes],
+            )
+            response_code_uuids = dict(
+                db.session.query(
+                    ResponseCode.response_code, ResponseCode.uuid
+                ).filter(ResponseCode.response_code.in_(response_codes))
+            )
+            db.session.execute(
+                ip_details_response_codes.insert(),
+                [
+                    {
+                        "ip_details_uuid": ip_details_uuids[ip_address],
+                        "response_code_uuid": response_code_uuids[code],
+                    }
+                    for ip_address in ip_addresses
+                    for code in response_codes_by_ip_address[ip_address]
+                ],
+            )
+
+        db.session.commit()
+
 
 class ResponseCode(db.Model):
     """A model representing a response code from a blocklist query.
@@ -0,0 +1,112 @@
+"""Support for caching and persisting queries at the /graphql endpoint.
+
+Queries are parsed and validated once and the resulting documents reused.
+With Automatic Persisted Queries (APQ) a client may also send the sha256
+hash of a query in place of the query itself. If the hash is unknown the
+client is told so and retries with both the hash and the query, which is
+then remembered for subsequent requests.
+
+Attributes:
+    PERSISTED_QUERY_VERSION: An int representing the supported version of
+        the persisted query protocol
+
+Classes:
+    CachedBackend()
+"""
+
+import hashlib
+import threading
+from functools import partial
+
+from cachetools import LRUCache
+from graphql import validate
+from graphql.backend import GraphQLCoreBackend
+from graphql_server import HttpQueryError
+
+PERSISTED_QUERY_VERSION = 1
+
+# Maps the sha256 hexdigest of a query to the query
+_persisted_queries = LRUCache(maxsize=128)
+_persisted_queries_lock = threading.Lock()
+
+
+class CachedBackend(GraphQLCoreBackend):
+    """A GraphQL backend that caches parsed and validated documents.
+
+    Attributes:
+        cache: An LRUCache mapping a schema and query to its document
+        cache_lock: A Lock guarding the cache across request threads
+    """
+
+    def __init__(self, maxsize=128):
+        """Create a backend with an empty cache.
+
+        Args:
+            maxsize: An int representing the max number of documents to cache
+                (default: 128)
+        """
+        super().__init__()
+        self.cache = LRUCache(maxsize=maxsize)
+        self.cache_lock = threading.Lock()
+
+    def document_from_string(self, schema, document_string):
+        """Parse and validate a query once, then reuse its document.
+
+        Args:
+            schema: A graphql Schema object to validate the query against
+            document_string: A str representing the query
+
+        Returns:
+            A GraphQLDocument representing the query
+        """
+        key = (schema, document_string)
+        with self.cache_lock:
+            document = self.cache.get(key)
+
+        if document is None:
+            document = super().document_from_string(schema, document_string)
+            if not validate(schema, document.document_ast):
+                document.execute = partial(document.execute, validate=False)
+
+            with self.cache_lock:
+                self.cache[key] = document
+
+        return document
+
+
+def apply_persisted_query(params):
+    """Fill in or remember the query of a GraphQL request using its hash.
+
+    Args:
+        params: A dict representing the body of a GraphQL request which is
+            updated in place with the persisted query if it is missing
+    """
+    extensions = params.get("extensions")
+    if not isinstance(extensions, dict):
+        return
+
+    persisted_query = extensions.get("persistedQuery")
+    if not isinstance(persisted_query, dict):
+        return
+
+    if persisted_query.get("version") != PERSISTED_QUERY_VERSION:
+        raise HttpQueryError(400, "Unsupported persisted query version")
+
+    sha256_hash = persisted_query.get("sha256Hash")
+    query = params.get("query")
+    if query is not None and not isinstance(query, str):
+        raise HttpQueryError(400, "Query must be a string")
+
+    if query is None:
+        with _persisted_queries_lock:
+            query = _persisted_queries.get(sha256_hash)
+
+        if query is None:
+            raise HttpQueryError(200, "PersistedQueryNotFound")
+
+        params["query"] = query
+    elif hashlib.sha256(query.encode("utf-8")).hexdigest() != sha256_hash:
+        raise HttpQueryError(400, "Provided sha256Hash does not match query")
+    else:
+        with _persisted_queries_lock:
+            _persisted_queries[sha256_hash] = query
@@ -4,20 +4,107 @@ Attributes:
     schema: A graphene Schema object
 
 Classes:
+    ResponseCodesLoader()
+    IPDetailsLoader()
     IPDetailsType()
     Enqueue()
     Mutation()
 """
 
-import concurrent.futures
-
 import graphene
 from graphene import Field, List, String
 from graphene_sqlalchemy import SQLAlchemyObjectType
 from graphql import GraphQLError
+from promise import Promise
+from promise.dataloader import DataLoader
+from sqlalchemy import inspect
+from sqlalchemy.orm import selectinload
+
+from dns_lookup import enqueue
+from models import IPDetails, ResponseCode, db, ip_details_response_codes
+
+
+def load_related(keys, model, key_column, related_column):
+    """Load the rows related to many keys through the association table.
+
+    Args:
+        keys: A list of ints representing the uuids to load related rows for
+        model: A SQLAlchemy model of the related rows
+        key_column: A str representing the column of the association table
+            that holds the keys
+        related_column: A str representing the column of the association
+            table that holds the uuids of the related rows
+
+    Returns:
+        A Promise resolving to a list of lists of the related rows, one per
+            key
+    """
+    key_column = ip_details_response_codes.c[key_column]
+    rows = (
+        db.session.query(model, key_column)
+        .join(
+            ip_details_response_codes,
+            model.uuid == ip_details_response_codes.c[related_column],
+        )
+        .filter(key_column.in_(keys))
+    )
+    related = {key: [] for key in keys}
+    for row, key in rows:
+        related[key].append(row)
+
+    return Promise.resolve([related[key] for key in keys])
+
+
+class ResponseCodesLoader(DataLoader):
+    """Loads the response codes of many ip details in a single query."""
+
+    def batch_load_fn(self, keys):  # pylint: disable=method-hidden,no-self-use
+        """Load the response codes of each ip details.
+
+        Args:
+            keys: A list of ints representing the uuids of the ip details
+
+        Returns:
+            A Promise resolving to a list of lists of ResponseCode objects
+        """
+        return load_related(
+            keys, ResponseCode, "ip_details_uuid", "response_code_uuid"
+        )
+
+
+class IPDetailsLoader(DataLoader):
+    """Loads the ip details of many response codes in a single query."""
+
+    def batch_load_fn(self, keys):  # pylint: disable=method-hidden,no-self-use
+        """Load the ip details of each response code.
+
+        Args:
+            keys: A list of ints representing the uuids of the response codes
+
+        Returns:
+            A Promise resolving to a list of lists of IPDetails objects
+        """
+        return load_related(
+            keys, IPDetails, "response_code_uuid", "ip_details_uuid"
+        )
+
 
-from dns_lookup import upsert_ip_details
-from models import IPDetails, ResponseCode
+def create_context(request=None):
+    """Create the context shared by the resolvers of a single request.
+
+    Loaders cache the rows they load, so each request gets its own.
+
+    Args:
+        request: A flask Request being served (default: None)
+
+    Returns:
+        A dict representing the request and the loaders for its resolvers
+    """
+    return {
+        "request": request,
+        "response_codes_loader": ResponseCodesLoader(),
+        "ip_details_loader": IPDetailsLoader(),
+    }
 
 
 class IPDetailsType(SQLAlchemyObjectType):
@@ -32,6 +119,22 @@ class IPDetailsType(SQLAlchemyObjectType):
 
         model = IPDetails
 
+    def resolve_response_codes(self, info):
+        """The resolver method for the response codes of an ip details.
+
+        Response codes loaded along with the ip details are used as is,
+        otherwise they are batched with those of the other ip details in the
+        request.
+
+        Returns:
+            A list, or a Promise of a list, of ResponseCode objects
+        """
+        # pylint: disable=no-member
+        if "response_codes" not in inspect(self).unloaded:
+            return self.response_codes
+
+        return info.context["response_codes_loader"].load(self.uuid)
+
 
 class ResponseCodeType(SQLAlchemyObjectType):
     """Creates a SQLAlchemy object type for Response model.
@@ -45,6 +148,22 @@ class ResponseCodeType(SQLAlchemyObjectType):
 
         model = ResponseCode
 
+    def resolve_ip_details(self, info):
+        """The resolver method for the ip details of a response code.
+
+        Ip details loaded along with the response code are used as is,
+        otherwise they are batched with those of the other response codes in
+        the request.
+
+        Returns:
+            A list, or a Promise of a list, of IPDetails objects
+        """
+        # pylint: disable=no-member
+        if "ip_details" not in inspect(self).unloaded:
+            return self.ip_details
+
+        return info.context["ip_details_loader"].load(self.uuid)
+
 
 class Enqueue(graphene.Mutation):
     """Create enqueue mutation for the graphql endpoint.
@@ -72,6 +191,10 @@ class Enqueue(graphene.Mutation):
     def mutate(self, _, ip_addresses):  # pylint: disable=no-self-use
         """Allow for mutation logic in this mutation.
 
+        The ip addresses are upserted by a background worker so this returns
+        without waiting on any DNS lookups. Duplicate ip addresses are only
+        enqueued once.
+
         Args:
             ip_addresses: A list of strs representing the ip addresses to
                 enqueue to the upsert func
@@ -80,9 +203,7 @@ class Enqueue(graphene.Mutation):
             An enqueue mutation object with the passed in ip addresses set as
                 an attribute
         """
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            executor.map(upsert_ip_details, ip_addresses)
-
+        enqueue(list(dict.fromkeys(ip_addresses)))
         return Enqueue(ip_addresses=ip_addresses)
 
 
@@ -104,6 +225,9 @@ class Query(graphene.ObjectType):
     ):  # pylint: disable=no-self-use
         """The resolver method for get_ip_details for the query.
 
+        The response codes are loaded along with the ip details in a second
+        query rather than lazily once they are selected.
+
         Args:
             ip_address: A str presenting the ip address to lookup in the db
 
@@ -111,7 +235,11 @@ class Query(graphene.ObjectType):
             ip_details: An IPDetails object representing the details for the
                 given ip address
         """
-        ip_details = IPDetails.query.filter_by(ip_address=ip_address).first()
+        ip_details = (
+            IPDetails.query.options(selectinload(IPDetails.response_codes))
+            .filter_by(ip_address=ip_address)
+            .first()
+        )
         if ip_details is None:
             raise GraphQLError("Details for given IP address cannot be found")
 
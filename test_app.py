@@ -5,29 +5,157 @@ Usage: test_app.py
 Attributes:
     TEST_DATABASE_URL: A str representing the location of the db used for
         testing
+    TEST_ENGINE_OPTIONS: A dict representing the options used to create the
+        SQLAlchemy engine for testing
+    PASSWORD_HASH: A str representing the hashed password of the test user
+    HEADERS_VALID: A dict representing headers with a valid Authorization
+        header
+    HEADERS_MISSING: A dict representing headers without an Authorization
+        header
+    HEADERS_NOT_BASIC: A dict representing headers with an Authorization
+        header that is not using basic auth
+    HEADERS_NOT_BASE64: A dict representing headers with an Authorization
+        header that is not base64 encoded
+    HEADERS_OVERSIZED: A dict representing headers with an Authorization
+        header that is too long to process
+    HEADERS_NUL: A dict representing headers with an Authorization header
+        that decodes to credentials containing a NUL byte
+    HEADERS_MISSING_PASSWORD: A dict representing headers with an
+        Authorization header that is missing a password
+    HEADERS_INVALID_USER: A dict representing headers with an Authorization
+        header with an invalid user
+    HEADERS_INVALID_PASSWORD: A dict representing headers with an
+        Authorization header with an invalid password
+    NESTED_QUERY: A str representing a query for the ip details of each
+        response code of an ip address
 
 Classes:
     BasicAuthTestCase()
     DNSLookupTestCase()
     GraphQLTestCase()
+    PersistedQueryTestCase()
 """
 
+import asyncio
 import base64
+import hashlib
+import threading
 import time
 import unittest
-from unittest.mock import Mock
+from types import SimpleNamespace
+from unittest.mock import patch
 
+from argon2 import PasswordHasher
 from graphene.test import Client
 from graphql import GraphQLError
+from graphql_server import HttpQueryError
+from sqlalchemy import event, inspect
+from sqlalchemy.pool import StaticPool
 from werkzeug.security import generate_password_hash
 
+import models
 from app import app
-from auth import basic_auth
-from dns_lookup import dns_lookup, upsert_ip_details
+from auth import _auth_cache, basic_auth
+from dns_lookup import dns_lookup, enqueue, lookup_all, upsert_ip_details
 from models import IPDetails, User, db, setup_db
-from schema import Enqueue, Query, schema
+from persisted_queries import CachedBackend, apply_persisted_query
+from schema import Enqueue, Query, create_context, schema
 
-TEST_DATABASE_URL = "sqlite:///test_db.sqlite3"
+app.config["DEBUG"] = False
+
+TEST_DATABASE_URL = "sqlite:///:memory:"
+TEST_ENGINE_OPTIONS = {
+    "poolclass": StaticPool,
+    "connect_args": {"check_same_thread": False},
+}
+
+# Password strength is irrelevant to these tests, so hash with the cheapest
+# argon2 parameters rather than paying for a production strength hash
+models.password_hasher = PasswordHasher(
+    time_cost=1, memory_cost=8, parallelism=1
+)
+PASSWORD_HASH = models.password_hasher.hash("supersecret")
+
+
+def basic_auth_header(credentials):
+    """Build the value of a basic Authorization header.
+
+    Args:
+        credentials: A bytes representing the username:password pair
+
+    Returns:
+        A str representing the value of the Authorization header
+    """
+    return "Basic " + base64.b64encode(credentials).decode("utf-8")
+
+
+HEADERS_VALID = {
+    "Authorization": basic_auth_header(b"secureworks:supersecret")
+}
+HEADERS_MISSING = {}
+HEADERS_NOT_BASIC = {
+    "Authorization": base64.b64encode(b"secureworks:supersecret").decode()
+}
+HEADERS_NOT_BASE64 = {"Authorization": "Basic secureworks:supersecret"}
+HEADERS_OVERSIZED = {
+    "Authorization": basic_auth_header(b"secureworks:" + b"a" * 4096)
+}
+HEADERS_NUL = {
+    "Authorization": basic_auth_header(b"secureworks\x00:supersecret")
+}
+HEADERS_MISSING_PASSWORD = {"Authorization": basic_auth_header(b"secureworks")}
+HEADERS_INVALID_USER = {
+    "Authorization": basic_auth_header(b"insecureworks:supersecret")
+}
+HEADERS_INVALID_PASSWORD = {
+    "Authorization": basic_auth_header(b"secureworks:password")
+}
+
+NESTED_QUERY = """
+    query {
+        getIpDetails(ipAddress: "127.0.0.4"){
+            responseCodes {
+                responseCode
+                ipDetails {
+                    ipAddress
+                }
+            }
+        }
+    }
+"""
+
+
+def persisted_query_params(sha256_hash, query=None):
+    """Build the body of a request that uses a persisted query.
+
+    Args:
+        sha256_hash: A str representing the hash of the query
+        query: A str representing the query (default: None)
+
+    Returns:
+        A dict representing the body of a GraphQL request
+    """
+    params = {
+        "extensions": {
+            "persistedQuery": {"version": 1, "sha256Hash": sha256_hash}
+        }
+    }
+    if query is not None:
+        params["query"] = query
+
+    return params
+
+
+def setUpModule():  # noqa: N802
+    """Set-up the db once for every test case in the module."""
+    setup_db(app, TEST_DATABASE_URL, TEST_ENGINE_OPTIONS)
+
+
+def reset_db():
+    """Empty the db by recreating its tables."""
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
 
 
 class BasicAuthTestCase(unittest.TestCase):
@@ -35,76 +163,102 @@ class BasicAuthTestCase(unittest.TestCase):
 
     Attributes:
         app: A flask app from app.py
-        mock: A mock object representing the fcn to be decorated by the
-            basic_auth decorator
-        basic_auth: A decorator used on the supplied mock object
-        database_url: A str representing the location of the db used for
-            testing
+        basic_auth: A fcn that returns True decorated by the basic_auth
+            decorator
     """
 
+    @classmethod
+    def setUpClass(cls):
+        """Set-up the db and test user once for the BasicAuthTestCase."""
+        cls.app = app
+        reset_db()
+        cls.basic_auth = staticmethod(basic_auth(lambda: True))
+        user = User(username="secureworks", password_hash=PASSWORD_HASH)
+        user.insert()
+
     def setUp(self):
         """Set-up for the BasicAuthTestCase."""
-        self.app = app
-        app.config["DEBUG"] = False
-        self.mock = Mock(return_value=True)
-        self.basic_auth = basic_auth(self.mock)
-        self.database_url = TEST_DATABASE_URL
-        setup_db(self.app, self.database_url)
-        user = User.query.filter_by(username="secureworks").first()
-        if user is None:
-            user = User(
-                username="secureworks",
-                password_hash=generate_password_hash("supersecret"),
-            )
-            user.insert()
+        _auth_cache.clear()
+
+    def tearDown(self):
+        """Tear-down for the BasicAuthTestCase."""
+        db.session.rollback()
+        _auth_cache.clear()
+
+    def call_basic_auth(self, headers):
+        """Call the decorated fcn as if handling a request.
+
+        Only the request headers are read by basic_auth, so a bare stand-in
+        for the flask request is used instead of a full request context.
+
+        Args:
+            headers: A dict representing the headers of the request
+
+        Returns:
+            The return value of the decorated fcn
+        """
+        with patch("auth.request", SimpleNamespace(headers=headers)):
+            return self.basic_auth()
 
     def test_basic_auth_success(self):
         """Test successful authentication when correct header is supplied."""
-        auth = base64.b64encode(b"secureworks:supersecret").decode("utf-8")
-        headers = {"Authorization": f"Basic {auth}"}
-        with self.app.test_request_context(headers=headers):
+        with self.app.test_request_context(headers=HEADERS_VALID):
             response = self.basic_auth()
 
         self.assertTrue(response)
 
-    def test_basic_auth_no_auth_header_fail(self):
-        """Test login failure when Authorization header is missing."""
-        with self.app.test_request_context():
-            self.assertRaises(GraphQLError, self.basic_auth)
-
-    def test_basic_auth_invalid_auth_header_fail(self):
-        """Test login failure when Auth header is not using basic auth."""
-        auth = base64.b64encode(b"secureworks:supersecret").decode("utf-8")
-        headers = {"Authorization": auth}
-        with self.app.test_request_context(headers=headers):
-            self.assertRaises(GraphQLError, self.basic_auth)
-
-    def test_basic_auth_cant_decode_auth_header_fail(self):
-        """Test login failure when Auth header is not base64 encoded."""
-        headers = {"Authorization": "Basic secureworks:supersecret"}
-        with self.app.test_request_context(headers=headers):
-            self.assertRaises(GraphQLError, self.basic_auth)
-
-    def test_basic_auth_missing_password_fail(self):
-        """Test login failure when password is missing."""
-        auth = base64.b64encode(b"secureworks").decode("utf-8")
-        headers = {"Authorization": f"Basic {auth}"}
-        with self.app.test_request_context(headers=headers):
-            self.assertRaises(GraphQLError, self.basic_auth)
+    def test_basic_auth_cached_success(self):
+        """Test a repeated Authorization header skips password checking."""
+        self.call_basic_auth(HEADERS_VALID)
+        with patch.object(User, "check_password") as check_password:
+            response = self.call_basic_auth(HEADERS_VALID)
+
+        self.assertTrue(response)
+        check_password.assert_not_called()
+
+    def test_check_password_upgrades_legacy_hash_success(self):
+        """Test a legacy password hash is replaced by an argon2 hash."""
+        user = User.query.filter_by(username="secureworks").first()
+        user.password_hash = generate_password_hash(
+            "supersecret", method="pbkdf2:sha256:1"
+        )
+        db.session.commit()
+        self.assertTrue(user.check_password("supersecret"))
+        self.assertTrue(user.password_hash.startswith("$argon2id$"))
+        self.assertTrue(user.check_password("supersecret"))
+
+    def test_basic_auth_failure_modes(self):
+        """Test login failure when Auth header is malformed or incorrect."""
+        cases = [
+            (HEADERS_MISSING, "header is missing"),
+            (HEADERS_NOT_BASIC, "not using basic auth"),
+            (HEADERS_NOT_BASE64, "not base64 encoded"),
+            (HEADERS_OVERSIZED, "too long to process"),
+            (HEADERS_NUL, "contains a NUL byte"),
+            (HEADERS_MISSING_PASSWORD, "password is missing"),
+            (HEADERS_INVALID_PASSWORD, "invalid password"),
+        ]
+        for headers, description in cases:
+            with self.subTest(description=description):
+                self.assertRaises(GraphQLError, self.call_basic_auth, headers)
+
+    def test_basic_auth_nul_logged_fail(self):
+        """Test a NUL byte is logged without logging the Auth header."""
+        with self.assertLogs("auth", level="WARNING") as logs:
+            self.assertRaises(GraphQLError, self.call_basic_auth, HEADERS_NUL)
+
+        output = "\n".join(logs.output)
+        self.assertNotIn(HEADERS_NUL["Authorization"], output)
+        self.assertNotIn("secureworks", output)
 
     def test_basic_auth_invalid_user_fail(self):
-        """Test login failure when invalid user is supplied."""
-        auth = base64.b64encode(b"insecureworks:supersecret").decode("utf-8")
-        headers = {"Authorization": f"Basic {auth}"}
-        with self.app.test_request_context(headers=headers):
-            self.assertRaises(GraphQLError, self.basic_auth)
+        """Test login failure without a password check for an invalid user."""
+        with patch.object(User, "check_password") as check_password:
+            self.assertRaises(
+                GraphQLError, self.call_basic_auth, HEADERS_INVALID_USER
+            )
 
-    def test_basic_auth_invalid_password_fail(self):
-        """Test login failure when invalid password is supplied."""
-        auth = base64.b64encode(b"secureworks:password").decode("utf-8")
-        headers = {"Authorization": f"Basic {auth}"}
-        with self.app.test_request_context(headers=headers):
-            self.assertRaises(GraphQLError, self.basic_auth)
+        check_password.assert_not_called()
 
 
 class DNSLookupTestCase(unittest.TestCase):
@@ -112,34 +266,68 @@ class DNSLookupTestCase(unittest.TestCase):
 
     Attributes:
         app: A flask app from app.py
-        database_url: A str representing the location of the db used for
-            testing
     """
 
     def setUp(self):
         """Set-up for the DNSLookupTestCase."""
         self.app = app
-        app.config["DEBUG"] = False
-        self.database_url = TEST_DATABASE_URL
-        setup_db(self.app, self.database_url)
+        reset_db()
 
     def test_dns_lookup_no_response_code_success(self):
         """Test successful DNS lookup when no response codes are expected."""
-        response_codes = dns_lookup("127.0.0.1")
+        response_codes = asyncio.run(dns_lookup("127.0.0.1"))
         self.assertEqual(len(response_codes), 0)
 
     def test_dns_lookup_response_code_success(self):
         """Test successful DNS lookup when response code(s) are expected."""
-        response_codes = dns_lookup("127.0.0.2")
+        response_codes = asyncio.run(dns_lookup("127.0.0.2"))
         self.assertGreater(len(response_codes), 0)
 
     def test_dns_lookup_incomplete_ip_address_fail(self):
         """Test DNS lookup failure when ip address is incomplete."""
-        self.assertRaises(TypeError, dns_lookup, "127.0.0")
+        self.assertRaises(TypeError, asyncio.run, dns_lookup("127.0.0"))
 
     def test_dns_lookup_malformed_ip_address_fail(self):
         """Test DNS lookup failure when ip address is malformed."""
-        self.assertRaises(TypeError, dns_lookup, "127.0.0.A")
+        self.assertRaises(TypeError, asyncio.run, dns_lookup("127.0.0.A"))
+
+    def test_dns_lookup_shorthand_ip_address_fail(self):
+        """Test DNS lookup failure when ip address uses shorthand notation."""
+        self.assertRaises(TypeError, asyncio.run, dns_lookup("127.1"))
+
+    def test_dns_lookup_nul_ip_address_fail(self):
+        """Test DNS lookup failure when ip address contains a NUL byte."""
+        self.assertRaises(TypeError, asyncio.run, dns_lookup("127.0.0.2\x00"))
+
+    def test_lookup_all_skips_malformed_ip_address_success(self):
+        """Test a malformed ip address is left out of a batch lookup."""
+        ip_addresses = ["127.0.0.1", "127.0.0.A", "127.0.0.2\x00"]
+        response_codes = asyncio.run(lookup_all(ip_addresses))
+        self.assertEqual(list(response_codes), ["127.0.0.1"])
+
+    def test_enqueue_worker_upserts_success(self):
+        """Test the worker upserts enqueued ip addresses, minus malformed."""
+        response_codes = {"127.0.0.2": ("127.0.0.2",)}
+        upserted = threading.Event()
+        with patch(
+            "dns_lookup.lookup_all", return_value=response_codes
+        ) as lookup, patch.object(
+            IPDetails, "bulk_upsert", side_effect=lambda _: upserted.set()
+        ) as bulk_upsert:
+            enqueue(["127.0.0.2", "127.0.0", "127.0.0.3\x00"])
+            self.assertTrue(upserted.wait(timeout=5))
+
+        lookup.assert_called_once_with(["127.0.0.2"])
+        bulk_upsert.assert_called_once_with(response_codes)
+
+    def test_lookup_all_cached_success(self):
+        """Test a batch lookup answers cached ip addresses without a query."""
+        response_codes = asyncio.run(dns_lookup("127.0.0.2"))
+        with patch("dns_lookup.resolve_response_codes") as resolve:
+            cached_response_codes = asyncio.run(lookup_all(["127.0.0.2"]))
+
+        resolve.assert_not_called()
+        self.assertEqual(cached_response_codes["127.0.0.2"], response_codes)
 
     def test_upsert_ip_details_insert_success(self):
         """Test successful insert into the db after DNS lookup."""
@@ -148,7 +336,7 @@ class DNSLookupTestCase(unittest.TestCase):
             db.session.delete(ip_details)
             db.session.commit()
 
-        upsert_ip_details("127.0.0.1")
+        upsert_ip_details(["127.0.0.1"])
         ip_details = IPDetails.query.filter_by(ip_address="127.0.0.1").first()
         self.assertIsNotNone(ip_details)
         self.assertEqual(ip_details.created_at, ip_details.updated_at)
@@ -163,10 +351,11 @@ class DNSLookupTestCase(unittest.TestCase):
         ip_details = IPDetails(ip_address="127.0.0.2")
         ip_details.insert()
         time.sleep(1)
-        upsert_ip_details("127.0.0.2")
+        upsert_ip_details(["127.0.0.2"])
         ip_details = IPDetails.query.filter_by(ip_address="127.0.0.2").first()
         self.assertIsNotNone(ip_details)
         self.assertGreater(ip_details.updated_at, ip_details.created_at)
+        self.assertGreater(len(ip_details.response_codes), 0)
 
 
 class GraphQLTestCase(unittest.TestCase):
@@ -174,35 +363,52 @@ class GraphQLTestCase(unittest.TestCase):
 
     Attributes:
         app: A flask app from app.py
-        database_url: A str representing the location of the db used for
-            testing
+        client: A graphene test Client for the schema
     """
 
     def setUp(self):
         """Set-up for the GraphQLTestCase."""
         self.app = app
-        app.config["DEBUG"] = False
         self.client = Client(schema)
-        self.database_url = TEST_DATABASE_URL
-        setup_db(self.app, self.database_url)
+        reset_db()
 
     def test_enqueue_success(self):
         """Test successful enqueue."""
         ip_addresses = ["127.0.0.1", "127.0.0.2"]
-        enqueue = Enqueue()
-        result = enqueue.mutate(None, ip_addresses)
+        mutation = Enqueue()
+        with patch("schema.enqueue") as enqueue_ip_addresses:
+            result = mutation.mutate(None, ip_addresses)
+
+        enqueue_ip_addresses.assert_called_once_with(ip_addresses)
+        self.assertEqual(result.ip_addresses, ip_addresses)
+
+    def test_enqueue_duplicate_ip_addresses_success(self):
+        """Test duplicate ip addresses are only enqueued once."""
+        ip_addresses = ["127.0.0.1", "127.0.0.2", "127.0.0.1"]
+        mutation = Enqueue()
+        with patch("schema.enqueue") as enqueue_ip_addresses:
+            result = mutation.mutate(None, ip_addresses)
+
+        enqueue_ip_addresses.assert_called_once_with(
+            ["127.0.0.1", "127.0.0.2"]
+        )
         self.assertEqual(result.ip_addresses, ip_addresses)
 
     def test_mutation_enqueue_success(self):
         """Test successful enqueue mutation request."""
-        result = self.client.execute(
-            """
-            mutation {
-                enqueue(ipAddresses: ["127.0.0.1", "127.0.0.2"]) {
-                    ipAddresses
+        with patch("schema.enqueue") as enqueue_ip_addresses:
+            result = self.client.execute(
+                """
+                mutation {
+                    enqueue(ipAddresses: ["127.0.0.1", "127.0.0.2"]) {
+                        ipAddresses
+                    }
                 }
-            }
-            """
+                """
+            )
+
+        enqueue_ip_addresses.assert_called_once_with(
+            ["127.0.0.1", "127.0.0.2"]
         )
         self.assertIsNone(result.get("errors"))
         self.assertEqual(
@@ -253,7 +459,8 @@ class GraphQLTestCase(unittest.TestCase):
                     }
                 }
             }
-            """
+            """,
+            context_value=create_context(),
         )
         self.assertIsNone(result.get("errors"))
         self.assertIsNotNone(result["data"]["getIpDetails"].get("uuid"))
@@ -267,6 +474,151 @@ class GraphQLTestCase(unittest.TestCase):
             result["data"]["getIpDetails"].get("ipAddress"), "127.0.0.1"
         )
 
+    def test_query_resolve_get_ip_details_loads_response_codes_success(self):
+        """Test get_ip_details loads the response codes with ip details."""
+        IPDetails.bulk_upsert({"127.0.0.4": ("127.0.0.2", "127.0.0.4")})
+        query = Query()
+        result = query.resolve_get_ip_details(None, "127.0.0.4")
+        self.assertNotIn("response_codes", inspect(result).unloaded)
+        self.assertEqual(len(result.response_codes), 2)
+
+    def test_query_get_ip_details_nested_success(self):
+        """Test the ip details of each response code are resolved."""
+        IPDetails.bulk_upsert(
+            {
+                "127.0.0.4": ("127.0.0.2", "127.0.0.4"),
+                "127.0.0.5": ("127.0.0.2",),
+            }
+        )
+        result = self.client.execute(
+            NESTED_QUERY, context_value=create_context()
+        )
+        self.assertIsNone(result.get("errors"))
+        ip_addresses = {
+            response_code["responseCode"]: sorted(
+                ip_details["ipAddress"]
+                for ip_details in response_code["ipDetails"]
+            )
+            for response_code in result["data"]["getIpDetails"][
+                "responseCodes"
+            ]
+        }
+        self.assertEqual(
+            ip_addresses,
+            {
+                "127.0.0.2": ["127.0.0.4", "127.0.0.5"],
+                "127.0.0.4": ["127.0.0.4"],
+            },
+        )
+
+    def test_query_get_ip_details_statement_count_success(self):
+        """Test nested relationships take one statement per level.
+
+        Resolving the ip details of each response code one at a time would
+        add a statement per response code, so the count must not grow as
+        more response codes are selected.
+        """
+        statement_counts = []
+        for response_codes in [
+            ("127.0.0.2",),
+            ("127.0.0.2", "127.0.0.4", "127.0.0.10", "127.0.0.11"),
+        ]:
+            IPDetails.bulk_upsert(
+                {"127.0.0.4": response_codes, "127.0.0.5": response_codes}
+            )
+            result, statements = self.execute_counting_statements(NESTED_QUERY)
+            self.assertIsNone(result.get("errors"))
+            self.assertEqual(
+                len(result["data"]["getIpDetails"]["responseCodes"]),
+                len(response_codes),
+            )
+            statement_counts.append(len(statements))
+
+        self.assertEqual(statement_counts, [3, 3])
+
+    def execute_counting_statements(self, query):
+        """Execute a query, recording the statements it sends to the db.
+
+        Args:
+            query: A str representing the GraphQL query to execute
+
+        Returns:
+            result: A dict representing the result of the query
+            statements: A list of strs representing the statements executed
+        """
+        statements = []
+
+        def record_statement(*args):
+            statements.append(args[2])
+
+        bind = db.session.get_bind()
+        event.listen(bind, "before_cursor_execute", record_statement)
+        try:
+            result = self.client.execute(query, context_value=create_context())
+        finally:
+            event.remove(bind, "before_cursor_execute", record_statement)
+
+        return result, statements
+
+
+class PersistedQueryTestCase(unittest.TestCase):
+    """Contains the test cases for testing automatic persisted queries.
+
+    Attributes:
+        query: A str representing the query to persist
+        sha256_hash: A str representing the sha256 hash of the query
+    """
+
+    def setUp(self):
+        """Set-up for the PersistedQueryTestCase."""
+        self.query = "{ responseCode { responseCode } }"
+        self.sha256_hash = hashlib.sha256(self.query.encode()).hexdigest()
+
+    def test_apply_persisted_query_success(self):
+        """Test a registered query can be requested by its hash alone."""
+        apply_persisted_query(
+            persisted_query_params(self.sha256_hash, self.query)
+        )
+        params = persisted_query_params(self.sha256_hash)
+        apply_persisted_query(params)
+        self.assertEqual(params["query"], self.query)
+
+    def test_apply_persisted_query_not_found_fail(self):
+        """Test an unregistered hash is reported as not found."""
+        params = persisted_query_params(hashlib.sha256(b"unknown").hexdigest())
+        with self.assertRaises(HttpQueryError) as context:
+            apply_persisted_query(params)
+
+        self.assertEqual(str(context.exception), "PersistedQueryNotFound")
+
+    def test_apply_persisted_query_hash_mismatch_fail(self):
+        """Test a query is not registered under a hash that doesn't match."""
+        params = persisted_query_params(
+            self.sha256_hash, "{ responseCode { uuid } }"
+        )
+        self.assertRaises(HttpQueryError, apply_persisted_query, params)
+
+    def test_apply_persisted_query_not_a_string_fail(self):
+        """Test a query that is not a str is rejected as a bad request."""
+        params = persisted_query_params(self.sha256_hash, 5)
+        with self.assertRaises(HttpQueryError) as context:
+            apply_persisted_query(params)
+
+        self.assertEqual(context.exception.status_code, 400)
+
+    def test_cached_backend_validates_once_success(self):
+        """Test a query is parsed and validated once across requests."""
+        backend = CachedBackend()
+        with patch("persisted_queries.validate", return_value=[]) as validate:
+            document = backend.document_from_string(schema, self.query)
+            cached_document = backend.document_from_string(schema, self.query)
+            result = cached_document.execute()
+
+        validate.assert_called_once_with(schema, document.document_ast)
+        self.assertIs(cached_document, document)
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data, {"responseCode": None})
+
 
 if __name__ == "__main__":
     unittest.main()